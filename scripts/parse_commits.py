@@ -1,56 +1,61 @@
 #!/usr/bin/env python3
+import bisect
 import re
 import subprocess
-from datetime import datetime, timezone, timedelta
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 import sys
 
-def get_git_log_data():
-    """Execute git log command to get all commits across all branches"""
-    try:
-        # Use a different separator that's less likely to appear in commit messages
-        # Removed --no-merges to include merge commits
-        cmd = ["git", "log", "--all", "--pretty=format:%H∞%ai∞%s∞%D", "--name-only"]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        print(f"Error running git command: {e}")
-        return ""
+# Patterns used once per commit, compiled up front
+_HEAD_RE = re.compile(r'HEAD -> ([^,\s]+)')
+_ORIGIN_RE = re.compile(r'origin/([^,\s]+)')
+_PR_RE = re.compile(r'Merge pull request #\d+ from [^/]+/(.+)')
+_MERGE_BRANCH_RE = re.compile(r"Merge branch '([^']+)'")
+
+@dataclass
+class CommitLog:
+    """Commits from the git log as parallel per-field lists, oldest first"""
+    hashes: list
+    timestamps: list
+    messages: list
+    refs: list
+    files: list
+    is_merge: list
+    branches: list
+
+def iter_git_log_fields():
+    """Stream NUL-terminated git log fields for all commits across all branches"""
+    # -z terminates every field and file name with NUL, so no custom separator is needed
+    # Skip rename detection; core.quotePath=false is redundant under -z
+    # Removed --no-merges to include merge commits
+    cmd = ["git", "-c", "core.quotePath=false", "log", "--all", "--no-renames", "-z",
+           "--pretty=format:%H%x00%ai%x00%s%x00%D", "--name-only"]
+    # -z writes path bytes verbatim, so keep any that aren't valid text as
+    # surrogates rather than failing to decode
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True, errors='surrogateescape') as proc:
+        pending = ''
+        for chunk in iter(lambda: proc.stdout.read(1 << 16), ''):
+            fields = (pending + chunk).split('\0')
+            pending = fields.pop()
+            yield from fields
+        if pending:
+            yield pending
+    if proc.returncode:
+        print(f"Error running git command: {subprocess.CalledProcessError(proc.returncode, cmd)}")
 
 def parse_timestamp(timestamp_str):
     """Parse timestamp with timezone and convert to UTC"""
-    timestamp_str = timestamp_str.strip()
-    
     # Parse the full timestamp with timezone
     try:
-        # Git uses ISO format like "2025-07-29 22:19:01 -0400"
-        if ' +' in timestamp_str or ' -' in timestamp_str:
-            # Split at the last space to separate timezone
-            dt_part, tz_part = timestamp_str.rsplit(' ', 1)
-            
-            # Parse the datetime part
-            dt = datetime.fromisoformat(dt_part)
+        # Git uses fixed-width ISO format like "2025-07-29 22:19:01 -0400"
+        if len(timestamp_str) == 25 and timestamp_str[20] in '+-':
+            s = timestamp_str
+            dt = datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                          int(s[11:13]), int(s[14:16]), int(s[17:19]))
             
-            # Parse timezone offset
-            if tz_part.startswith('+'):
-                sign = 1
-                tz_str = tz_part[1:]
-            else:  # starts with '-'
-                sign = -1
-                tz_str = tz_part[1:]
-            
-            # Parse HHMM format
-            hours = int(tz_str[:2])
-            minutes = int(tz_str[2:])
-            
-            # Create timezone offset
-            offset_minutes = sign * (hours * 60 + minutes)
-            tz = timezone(timedelta(minutes=offset_minutes))
-            
-            # Apply timezone and convert to UTC
-            dt_with_tz = dt.replace(tzinfo=tz)
-            dt_utc = dt_with_tz.astimezone(timezone.utc)
-            
-            return dt_utc.replace(tzinfo=None)  # Return naive UTC datetime
+            # Subtract the HHMM offset to get naive UTC
+            sign = 1 if s[20] == '+' else -1
+            return dt - sign * timedelta(hours=int(s[21:23]), minutes=int(s[23:25]))
         else:
             # No timezone, assume UTC
             return datetime.fromisoformat(timestamp_str)
@@ -67,13 +72,13 @@ def extract_branch_from_refs(refs_str):
     refs_str = refs_str.strip()
     if "HEAD -> " in refs_str:
         # Extract the current branch after HEAD -> 
-        match = re.search(r'HEAD -> ([^,\s]+)', refs_str)
+        match = _HEAD_RE.search(refs_str)
         if match:
             return match.group(1)
     
     # Look for feature branch patterns first (not main/master)
     if "origin/" in refs_str:
-        matches = re.findall(r'origin/([^,\s]+)', refs_str)
+        matches = _ORIGIN_RE.findall(refs_str)
         for branch in matches:
             if branch not in ["HEAD", "main", "master"]:
                 return branch
@@ -95,205 +100,180 @@ def extract_branch_from_refs(refs_str):
 def extract_branch_from_merge_message(message):
     """Extract branch name from merge commit message"""
     # Pattern: "Merge pull request #N from user/branch-name"
-    match = re.search(r'Merge pull request #\d+ from [^/]+/(.+)', message)
+    match = _PR_RE.search(message)
     if match:
         return match.group(1).strip()
     
     # Pattern: "Merge branch 'branch-name'"
-    match = re.search(r"Merge branch '([^']+)'", message)
+    match = _MERGE_BRANCH_RE.search(message)
     if match:
         return match.group(1).strip()
     
     return None
 
-def determine_commit_branches(commits):
-    """Determine the original branch for each commit using merge analysis"""
-    # Sort commits by timestamp (oldest first)
-    sorted_commits = sorted(commits, key=lambda x: x['timestamp'])
+def determine_commit_branches(timestamps, messages, hashes, refs_list):
+    """Determine the original branch for each commit using merge analysis
     
+    Takes parallel per-commit lists sorted by timestamp (oldest first), as
+    parse_commits builds them, and returns the list of branch names.
+    """
     # First pass: identify merge commits and extract branch info
-    merge_branches = {}
+    merge_hashes = set()
     branch_periods = []
     
-    for commit in sorted_commits:
-        if commit['message'].startswith('Merge') or '[MERGE]' in commit.get('type', ''):
-            branch = extract_branch_from_merge_message(commit['message'])
+    for i, message in enumerate(messages):
+        if message.startswith('Merge'):
+            branch = extract_branch_from_merge_message(message)
             if branch:
-                merge_branches[commit['hash']] = {
-                    'branch': branch,
-                    'timestamp': commit['timestamp'],
-                    'message': commit['message']
-                }
+                merge_hashes.add(hashes[i])
+                
+                # Skip cursor branches and other non-project branches
+                if 'cursor/' in branch or 'integrate-checklists' in branch:
+                    continue
+                
                 # Record when this branch was merged
                 branch_periods.append({
                     'branch': branch,
-                    'merge_time': commit['timestamp'],
-                    'merge_hash': commit['hash']
+                    'merge_time': timestamps[i],
+                    'merge_hash': hashes[i]
                 })
     
-    # Sort branch periods by merge time
-    branch_periods.sort(key=lambda x: x['merge_time'])
+    # Branch periods are already in merge time order
+    merge_times = [period['merge_time'] for period in branch_periods]
+    branch_window = timedelta(hours=2)
     
-    # Second pass: assign branches to commits
-    for commit in sorted_commits:
-        # If this commit has explicit branch refs, use them
-        refs_branch = extract_branch_from_refs(commit.get('refs', ''))
-        if refs_branch:
-            commit['branch'] = refs_branch
-            continue
-        
+    # Second pass: commits with explicit branch refs use them, the rest
+    # are left for merge analysis
+    branches = [None] * len(hashes)
+    unassigned = []
+    for i, refs in enumerate(refs_list):
+        if refs:
+            branches[i] = extract_branch_from_refs(refs)
+            if branches[i]:
+                continue
+        unassigned.append(i)
+    
+    # Third pass: assign branches to the remaining commits
+    for i in unassigned:
         # If this is a merge commit, it goes to main
-        if commit['hash'] in merge_branches:
-            commit['branch'] = "main"
+        if hashes[i] in merge_hashes:
+            branches[i] = "main"
             continue
         
         # For other commits, determine branch by looking at which branch period they fall into
-        commit_time = commit['timestamp']
+        commit_time = timestamps[i]
         assigned_branch = "main"  # default
         
-        # Find the branch that this commit most likely belongs to
-        for period in branch_periods:
-            merge_time = period['merge_time']
-            branch_name = period['branch']
-            
-            # Skip cursor branches and other non-project branches
-            if 'cursor/' in branch_name or 'integrate-checklists' in branch_name:
-                continue
-            
-            # If commit is within 2 hours before this merge, likely belongs to this branch
-            time_diff = merge_time - commit_time
-            if 0 <= time_diff.total_seconds() <= 2 * 3600:  # 2 hours
-                assigned_branch = branch_name
-                break
+        # Find the first merge at or after the commit; if the commit is within
+        # 2 hours before it, it likely belongs to that branch
+        idx = bisect.bisect_left(merge_times, commit_time)
+        if idx < len(merge_times) and merge_times[idx] - commit_time <= branch_window:
+            assigned_branch = branch_periods[idx]['branch']
         
-        commit['branch'] = assigned_branch
+        branches[i] = assigned_branch
+    
+    return branches
 
 def parse_commits():
-    git_log_data = get_git_log_data()
-    if not git_log_data:
-        return []
-        
-    commits = []
-    lines = git_log_data.strip().split('\n')
+    hashes, timestamps, messages, refs_list, files_list, merge_flags = [], [], [], [], [], []
+    fields = iter_git_log_fields()
     
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        if not line:
-            i += 1
+    for hash_val in fields:
+        # Each record is hash, timestamp, message and refs. Git puts a newline between
+        # the refs and the first file, and an empty field after the last file.
+        timestamp_str = next(fields, '')
+        message = next(fields, '')
+        refs, has_files, first_file = next(fields, '').partition('\n')
+        
+        files = []
+        if has_files:
+            files.append(first_file)
+            for file in fields:
+                if not file:
+                    break
+                files.append(file)
+        
+        # Parse timestamp
+        timestamp = parse_timestamp(timestamp_str)
+        if timestamp is None:
             continue
-            
-        # Check if this line has the commit format (hash∞timestamp∞message∞refs)
-        if '∞' in line:
-            parts = line.split('∞')
-            if len(parts) >= 3:
-                hash_val = parts[0]
-                timestamp_str = parts[1] 
-                message = parts[2]
-                refs = parts[3] if len(parts) > 3 else ""
-                
-                # Parse timestamp
-                timestamp = parse_timestamp(timestamp_str)
-                if timestamp is None:
-                    i += 1
-                    continue
-                
-                # Collect files (lines after the commit line until next commit or end)
-                files = []
-                i += 1
-                while i < len(lines):
-                    next_line = lines[i].strip()
-                    if not next_line:
-                        i += 1
-                        continue
-                    # Check if this is another commit line
-                    if '∞' in next_line and len(next_line.split('∞')[0]) == 40:  # 40 char hash
-                        break
-                    files.append(next_line)
-                    i += 1
-                
-                commits.append({
-                    'hash': hash_val,
-                    'timestamp': timestamp,
-                    'message': message,
-                    'refs': refs,
-                    'files': files
-                })
-            else:
-                i += 1
-        else:
-            i += 1
+        
+        hashes.append(hash_val)
+        timestamps.append(timestamp)
+        messages.append(message)
+        refs_list.append(refs)
+        files_list.append(files)
+        # Detect if this is a merge commit once, rather than on every formatting pass
+        merge_flags.append(message.startswith('Merge') or 'merge' in message.lower())
+    
+    # Sort by timestamp (oldest first), once for every consumer
+    order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+    hashes, timestamps, messages, refs_list, files_list, merge_flags = (
+        [column[i] for i in order]
+        for column in (hashes, timestamps, messages, refs_list, files_list, merge_flags)
+    )
     
     # Determine branches for all commits
-    determine_commit_branches(commits)
+    branches = determine_commit_branches(timestamps, messages, hashes, refs_list)
     
-    return commits
+    return CommitLog(hashes, timestamps, messages, refs_list, files_list, merge_flags, branches)
 
-def format_timeline():
-    commits = parse_commits()
-    
-    # Sort by timestamp (oldest first)
-    commits.sort(key=lambda x: x['timestamp'])
-    
-    if not commits:
-        return "No commits found"
+def format_timeline(log, out_file):
+    """Write the timeline for a parsed CommitLog to out_file, one commit entry at a time"""
+    if not log.hashes:
+        out_file.write("No commits found")
+        return
     
-    # Start time is the first commit
-    start_time = commits[0]['timestamp']
+    # Start time is the first commit; compute seconds from start and the delta
+    # from the previous commit for all commits up front
+    start_time = log.timestamps[0]
+    from_start = [int((timestamp - start_time).total_seconds()) for timestamp in log.timestamps]
+    deltas = [0] + [cur - prev for prev, cur in zip(from_start, from_start[1:])]
     
-    result = []
-    prev_time = start_time
-    
-    for commit in commits:
+    for i, seconds in enumerate(from_start):
         # Calculate time from start
-        time_diff = commit['timestamp'] - start_time
-        hours = int(time_diff.total_seconds() // 3600)
-        minutes = int((time_diff.total_seconds() % 3600) // 60)
+        hours, rem = divmod(seconds, 3600)
+        minutes = rem // 60
         
         # Calculate delta from previous commit
-        delta_diff = commit['timestamp'] - prev_time
-        delta_hours = int(delta_diff.total_seconds() // 3600) 
-        delta_minutes = int((delta_diff.total_seconds() % 3600) // 60)
+        delta_total_minutes = deltas[i] // 60
         
         # Format time string
-        if commit == commits[0]:
+        if i == 0:
             time_str = "time: 00:00"
         else:
-            delta_total_minutes = delta_hours * 60 + delta_minutes
             time_str = f"time: {hours:02d}:{minutes:02d}  (+{delta_total_minutes} mins)"
         
-        # Detect if this is a merge commit
-        is_merge = commit['message'].startswith('Merge') or 'merge' in commit['message'].lower()
-        commit_type = " [MERGE]" if is_merge else ""
+        commit_type = " [MERGE]" if log.is_merge[i] else ""
+        
+        # Empty line after each commit
+        if i:
+            out_file.write("\n")
         
-        # Build commit entry
+        # Write commit entry
         entry = [
             time_str,
-            f"commit: {commit['hash']}{commit_type}",
-            f"branch: {commit['branch']}",
+            f"commit: {log.hashes[i]}{commit_type}",
+            f"branch: {log.branches[i]}",
             "",
-            commit['message'],
+            log.messages[i],
             ""
         ]
+        out_file.write('\n'.join(entry) + '\n')
         
         # Add files
-        for file in commit['files']:
-            entry.append(f"  {file}")
-        
-        entry.append("")  # Empty line after each commit
-        
-        result.extend(entry)
-        prev_time = commit['timestamp']
-    
-    return '\n'.join(result)
+        for file in log.files[i]:
+            out_file.write(f"  {file}\n")
 
 def main():
-    timeline = format_timeline()
+    # Parse everything before opening the output, so a failed run leaves the old file alone
+    log = parse_commits()
     
     # Write to file instead of printing to console
     output_file = "commit-timeline.txt"
-    with open(output_file, 'w') as f:
-        f.write(timeline)
+    # Write undecodable path bytes back out unchanged
+    with open(output_file, 'w', buffering=1 << 20, errors='surrogateescape') as f:
+        format_timeline(log, f)
     
     print(f"Timeline written to {output_file}")
 